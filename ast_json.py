@@ -0,0 +1,87 @@
+import json
+import re
+from typing import Optional
+
+import orjson
+
+# orjson reads integers beyond 64 bits as floats, so documents that may hold one go through json
+_BIG_INT_RE = re.compile(r"\d{19,}")
+
+
+def load_ast(content: str) -> dict:
+    try:
+        if _BIG_INT_RE.search(content):
+            return json.loads(content)
+        return orjson.loads(content)
+    except Exception as e:
+        return {"error": str(e), "raw_response": content}
+
+
+# orjson refuses integers beyond 64 bits, which json serializes exactly
+def dumps_ast(ast) -> str:
+    try:
+        return orjson.dumps(ast).decode()
+    except TypeError:
+        return json.dumps(ast, separators=(",", ":"), ensure_ascii=False)
+
+
+# An escape sequence cut off at the end of a streamed string: the last of an odd run of
+# backslashes, with the start of a \uXXXX escape if one follows
+_CUT_ESCAPE_RE = re.compile(r"(?<!\\)(?:\\\\)*(\\(?:u[0-9a-fA-F]{0,3})?)$")
+
+
+# Best-effort value of a string field from JSON that is still being streamed
+def partial_json_string(partial: str, field: str) -> Optional[str]:
+    match = re.search(r'"%s"\s*:\s*"' % field, partial)
+    if not match:
+        return None
+
+    value = partial[match.end():]
+    decoder = json.JSONDecoder()
+    cut_escape = _CUT_ESCAPE_RE.search(value)
+    if cut_escape:
+        value = value[:cut_escape.start(1)]
+    for candidate in ('"' + value, '"' + value + '"'):
+        try:
+            return decoder.raw_decode(candidate)[0]
+        except ValueError:
+            continue
+    return None
+
+
+def extract_ansi_sql(content: str) -> str:
+    try:
+        return orjson.loads(content)["ansi_sql"].strip()
+    except Exception:
+        return content.strip()
+
+
+# Drops empty values (None, "", [] or {}) using an explicit stack instead of recursion
+def compact_ast(node):
+    if not isinstance(node, (dict, list)):
+        return node
+
+    root = {} if isinstance(node, dict) else []
+    stack = [(node, root)]
+    links = []  # (parent copy, key, child copy), every parent before its children
+    while stack:
+        source, target = stack.pop()
+        items = source.items() if isinstance(source, dict) else enumerate(source)
+        for key, value in items:
+            if isinstance(target, dict) and (value is None or value == ""):
+                continue
+            if isinstance(value, (dict, list)):
+                child = {} if isinstance(value, dict) else []
+                stack.append((value, child))
+                links.append((target, key, child))
+                value = child
+            if isinstance(target, dict):
+                target[key] = value
+            else:
+                target.append(value)
+
+    # In reverse, every child is pruned before its parent checks it for emptiness
+    for parent, key, child in reversed(links):
+        if isinstance(parent, dict) and not child:
+            del parent[key]
+    return root
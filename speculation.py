@@ -0,0 +1,26 @@
+import asyncio
+from typing import Any, Awaitable
+
+
+# Races a primary call against a speculative one and returns (primary_won, result). The primary
+# result is used when it finishes first, within grace_seconds of the speculative one, or when the
+# speculative call fails; the losing call is cancelled, as are both on error or outer cancellation.
+async def race_with_speculation(
+    primary: Awaitable, speculative: Awaitable, grace_seconds: float
+) -> tuple[bool, Any]:
+    t_primary = asyncio.ensure_future(primary)
+    t_speculative = asyncio.ensure_future(speculative)
+
+    try:
+        done, _ = await asyncio.wait({t_primary, t_speculative}, return_when=asyncio.FIRST_COMPLETED)
+        if t_primary not in done:
+            await asyncio.wait({t_primary}, timeout=grace_seconds)
+
+        # A failed speculative call, e.g. a rate limit on its model, falls back to the normal path
+        if t_primary.done() or t_speculative.exception() is not None:
+            return True, await t_primary
+        return False, t_speculative.result()
+    finally:
+        for task in (t_primary, t_speculative):
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,52 @@
+import re
+
+# Every character of the input falls in exactly one token, and quoted text and comments are
+# kept whole, so a ';' or quote inside them is never mistaken for SQL structure
+_SQL_TOKEN_RE = re.compile(
+    r"""
+    (?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))
+    |(?P<quoted>'(?:[^'\\]|''|\\.)*(?:'|\Z)|"(?:[^"]|"")*(?:"|\Z)|\$\$.*?(?:\$\$|\Z))
+    |(?P<semicolon>;)
+    |(?P<space>\s+)
+    |(?P<word>[\w$]+)
+    |(?P<operator><>|!=|<=|>=|\|\||::|=>|.)
+    """,
+    re.S | re.X,
+)
+
+
+# Normalized token stream of a query: case and whitespace are folded, comments, trailing
+# semicolons and the optional AS keyword are dropped, and everything else is kept as written
+def sql_tokens(sql: str) -> tuple:
+    tokens = []
+    for match in _SQL_TOKEN_RE.finditer(sql):
+        kind, text = match.lastgroup, match.group()
+        if kind in ("comment", "space"):
+            continue
+        if kind == "word":
+            text = text.upper()
+            if text == "AS":
+                continue
+        tokens.append(text)
+
+    while tokens and tokens[-1] == ";":
+        tokens.pop()
+    return tuple(tokens)
+
+
+# Splits a script on top-level semicolons; comments stay with the statement that follows them
+# and chunks holding nothing but comments and whitespace are dropped
+def split_sql_statements(sql_text: str) -> list:
+    statements, current, has_code = [], [], False
+    for match in _SQL_TOKEN_RE.finditer(sql_text):
+        if match.lastgroup == "semicolon":
+            if has_code:
+                statements.append("".join(current).strip())
+            current, has_code = [], False
+            continue
+        current.append(match.group())
+        has_code = has_code or match.lastgroup not in ("comment", "space")
+
+    if has_code:
+        statements.append("".join(current).strip())
+    return statements
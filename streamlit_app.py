@@ -1,11 +1,28 @@
+import asyncio
+import collections
 import json
-from typing import TypedDict, Annotated, Union
+import hashlib
+import pickle
+import queue
+import sqlite3
+import tempfile
+import threading
+from typing import Callable, Optional, TypedDict, Annotated, Union
+import httpx
+import orjson
+import re2
 from langchain_openai import ChatOpenAI
+from openai import OpenAI
 from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
 from langgraph.graph.message import add_messages
 import os
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from ast_json import compact_ast, dumps_ast, extract_ansi_sql, load_ast, partial_json_string
+from speculation import race_with_speculation
+from sql_text import split_sql_statements, sql_tokens
 
 
 st.sidebar.header("OpenAI API Key Configuration")
@@ -23,24 +40,203 @@ else:
     st.warning("Please enter your OpenAI API key to proceed.")
     st.stop()
 
+# Parsing SQL into an AST is mechanical, so the smaller model is the default
+PARSER_MODELS = ["gpt-4o-mini", "gpt-4o"]
+parser_model = st.sidebar.selectbox(
+    "Parser model:",
+    PARSER_MODELS,
+    help="gpt-4o-mini is faster and cheaper. Switch to gpt-4o if the AST comes back with a parse error.",
+)
+
 class ConverterState(TypedDict):
     input_query: str
     ast: Annotated[Union[dict, str, None], None]
     final_sql: Annotated[str, None]
 
 
-llm = ChatOpenAI(
-    temperature=0,
-    model_name="gpt-4o",  
-    streaming=False
-)
+# All OpenAI traffic shares pooled HTTP/2 connections, so consecutive agent calls
+# reuse an open connection instead of paying a new TCP and TLS handshake.
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=8, max_connections=16)
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+
+
+@st.cache_resource
+def get_http_client() -> httpx.Client:
+    return httpx.Client(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+
+
+@st.cache_resource
+def get_http_async_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+
+
+# Pooled async connections belong to the loop that opened them, so all sessions share one loop
+@st.cache_resource
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="openai-event-loop", daemon=True).start()
+    return loop
+
+
+def get_llm(api_key: str, model_name: str = "gpt-4o", streaming: bool = False) -> ChatOpenAI:
+    return ChatOpenAI(
+        temperature=0,
+        model_name=model_name,
+        streaming=streaming,
+        openai_api_key=api_key,
+        http_client=get_http_client(),
+        http_async_client=get_http_async_client(),
+    )
+
+
+# Streamlit reruns the whole script on every interaction, so the clients are built once per
+# session and rebuilt only when the key changes. They are kept in st.session_state rather than
+# a process-wide cache, so the key is gone with the session; only the pooled HTTP clients are shared.
+def session_chat_models(api_key: str) -> tuple[dict, ChatOpenAI]:
+    key_digest = hashlib.sha256(api_key.encode()).hexdigest()
+    if st.session_state.get("chat_models_key") != key_digest:
+        st.session_state.chat_models = {model: get_llm(api_key, model) for model in {"gpt-4o", *PARSER_MODELS}}
+        st.session_state.streaming_chat_model = get_llm(api_key, "gpt-4o", streaming=True)
+        st.session_state.chat_models_key = key_digest
+    return st.session_state.chat_models, st.session_state.streaming_chat_model
+
+
+# Looked up on the script thread and handed to the agents through the graph config
+chat_models, streaming_chat_model = session_chat_models(api_key)
 
-def parse_sql_to_ast(state: ConverterState) -> dict:
 
-    with st.spinner("Thinking..."):
-        query = state["input_query"]
+LLM_CACHE_PATH = os.path.join(".llm_cache", "responses.sqlite3")
+LLM_MEMO_MAX = 256
 
-        system_prompt = """
+
+# One SQLite connection shared by all sessions; the lock serializes the worker threads using it
+class LLMResponseCache:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, content TEXT NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with self._lock:
+                row = self._conn.execute("SELECT content FROM responses WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else None
+        except Exception:
+            return None
+
+    def put(self, key: str, content: str) -> None:
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, content) VALUES (?, ?)",
+                    (key, content),
+                )
+        except Exception:
+            pass
+
+
+@st.cache_resource
+def get_llm_response_cache() -> Optional[LLMResponseCache]:
+    try:
+        return LLMResponseCache(LLM_CACHE_PATH)
+    except Exception:
+        return None
+
+
+# Caches responses per (stage, model, system prompt, user message), in the session and on disk
+async def cached_ainvoke(
+    stage: str,
+    messages: list,
+    config: RunnableConfig,
+    on_token: Optional[Callable[[str], None]] = None,
+    model: str = "gpt-4o",
+    **invoke_kwargs,
+) -> str:
+    configurable = config.get("configurable", {})
+    if configurable.get("user"):
+        invoke_kwargs["user"] = configurable["user"]
+
+    system_prompt = messages[0]["content"]
+    user_message = messages[1]["content"]
+    key = hashlib.sha256(
+        b"\0".join(part.encode() for part in (stage, model, system_prompt, user_message))
+    ).hexdigest()
+
+    memo = configurable.get("llm_memo", {})
+    if key in memo:
+        return memo[key]
+
+    # SQLite I/O runs in a worker thread so it never blocks the shared event loop
+    llm_cache = configurable.get("llm_cache")
+    content = await asyncio.to_thread(llm_cache.get, key) if llm_cache else None
+
+    if content is None:
+        if on_token is None:
+            content = (await configurable["chat_models"][model].ainvoke(messages, **invoke_kwargs)).content
+        else:
+            content = ""
+            async for chunk in configurable["streaming_chat_model"].astream(messages, **invoke_kwargs):
+                content += chunk.content
+                on_token(content)
+        if llm_cache:
+            await asyncio.to_thread(llm_cache.put, key, content)
+
+    memo[key] = content
+    while len(memo) > LLM_MEMO_MAX:
+        memo.pop(next(iter(memo)))  # oldest first
+    return content
+
+
+QUERY_CACHE_PATH = os.path.join(".llm_cache", "query_results.pkl")
+QUERY_CACHE_MAX = 1024
+
+
+# Final results keyed on the normalized token stream, so whitespace, case, comment and alias
+# variants of a query are answered without any network call. Kept in memory and shared by all
+# sessions; the lock serializes access, and the pickle on disk is replaced atomically.
+class QueryResultCache:
+    def __init__(self, path: str):
+        self._path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, "rb") as f:
+                self._entries = pickle.load(f)
+        except Exception:
+            self._entries = {}
+
+    def get(self, key: tuple):
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key: tuple, value: tuple) -> None:
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > QUERY_CACHE_MAX:
+                self._entries.pop(next(iter(self._entries)))  # oldest first
+            try:
+                directory = os.path.dirname(self._path)
+                os.makedirs(directory, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "wb") as f:
+                        pickle.dump(self._entries, f)
+                    os.replace(tmp_path, self._path)
+                except BaseException:
+                    os.unlink(tmp_path)
+                    raise
+            except Exception:
+                pass
+
+
+@st.cache_resource
+def get_query_result_cache() -> QueryResultCache:
+    return QueryResultCache(QUERY_CACHE_PATH)
+
+
+PARSER_SYS = """
     Role: You are a SQL parsing assistant, and you are an expert at building Abstract Syntax Trees (ASTs) from Snowflake SQL.
 
     Task: Convert a single Snowflake SQL query into a valid JSON AST.
@@ -79,6 +275,46 @@ def parse_sql_to_ast(state: ConverterState) -> dict:
     12) If you are unsure about certain Snowflake keywords, model them as logically as possible. For instance, treat ILIKE as a variant of a comparison operator, or store it under some "operator" key.
     13) Do not wrap your JSON in triple backticks (```), or any other code fence formatting.
     14) Do not prepend or append any text before or after the JSON. The final answer should be raw JSON.
+    15) Worked example. For the Snowflake query:
+        SELECT c.id, c.name, o.total
+        FROM customers c
+        JOIN orders o ON o.customer_id = c.id
+        WHERE c.name ILIKE 'a%'
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY c.id ORDER BY o.total DESC) = 1
+        a suitable AST is:
+        {
+           "type": "select_statement",
+           "select_list": [
+              {"type": "column_ref", "table": "c", "column": "id"},
+              {"type": "column_ref", "table": "c", "column": "name"},
+              {"type": "column_ref", "table": "o", "column": "total"}
+           ],
+           "from_clause": {
+              "type": "join_expression",
+              "join_type": "INNER",
+              "left_table": {"type": "table_ref", "name": "customers", "alias": "c"},
+              "right_table": {"type": "table_ref", "name": "orders", "alias": "o"},
+              "on_condition": {
+                 "type": "comparison", "operator": "=",
+                 "left": {"type": "column_ref", "table": "o", "column": "customer_id"},
+                 "right": {"type": "column_ref", "table": "c", "column": "id"}
+              }
+           },
+           "where_clause": {
+              "type": "comparison", "operator": "ILIKE",
+              "left": {"type": "column_ref", "table": "c", "column": "name"},
+              "right": {"type": "string_literal", "value": "a%"}
+           },
+           "qualify_clause": {
+              "type": "comparison", "operator": "=",
+              "left": {
+                 "type": "window_function", "name": "ROW_NUMBER", "arguments": [],
+                 "partition_by": [{"type": "column_ref", "table": "c", "column": "id"}],
+                 "order_by": [{"expression": {"type": "column_ref", "table": "o", "column": "total"}, "direction": "DESC"}]
+              },
+              "right": {"type": "numeric_literal", "value": 1}
+           }
+        }
 
     Output:
      - A strictly valid JSON AST reflecting all clauses in the input Snowflake SQL.
@@ -93,31 +329,27 @@ def parse_sql_to_ast(state: ConverterState) -> dict:
      - End your output immediately after the closing brace of the JSON object—nothing else.
     End of prompt.
     """
-        user_message = f"SQL to parse:\n{query}"
-
-        response = llm.invoke(
-            [ 
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message},
-            ]
-        )
 
-        try:
-            ast_data = json.loads(response.content)
-        except Exception as e:
-            ast_data = {"error": str(e), "raw_response": response.content}
 
-        return {
-            "ast": ast_data
-        }
+async def parse_sql_to_ast(state: ConverterState, config: RunnableConfig) -> dict:
+    query = state["input_query"]
+    user_message = "SQL to parse:\n" + query
 
-def translate_ast_to_ansi(state: ConverterState) -> dict:
+    content = await cached_ainvoke(
+        "parser",
+        [ 
+            {"role": "system", "content": PARSER_SYS},
+            {"role": "user", "content": user_message},
+        ],
+        config,
+        model=config.get("configurable", {}).get("parser_model", PARSER_MODELS[0]),
+    )
 
-    with st.spinner("Translating Snowflake SQL to ANSI SQL..."):
-        ast_data = state["ast"]
-        original_sql = state["input_query"]
+    return {
+        "ast": load_ast(content)
+    }
 
-        system_prompt = """
+TRANSLATOR_SYS = """
     Role: You are an expert SQL translator, specializing in converting Snowflake SQL to ANSI SQL.
 
     Task: Take two inputs:
@@ -167,33 +399,8 @@ def translate_ast_to_ansi(state: ConverterState) -> dict:
      - End your output right after the final SQL statement—nothing else.
     End of prompt.
     """
-        user_message = (
-            "Original Snowflake SQL:\n"
-            f"{original_sql}\n\n"
-            "AST:\n"
-            f"{json.dumps(ast_data, indent=2)}"
-        )
-
-        response = llm.invoke(
-            [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message},
-            ]
-        )
-        ansi_sql = response.content.strip()
-
-        return {
-            "final_sql": ansi_sql
-        }
-
-def validate_ansi_sql(state: ConverterState) -> dict:
 
-    with st.spinner("Validating ANSI SQL..."):
-        
-        candidate_sql = state["final_sql"]
-        original_sql = state["input_query"]
-
-        system_prompt = """
+VALIDATOR_SYS = """
     Role: You are an advanced SQL validator, ensuring both syntax correctness and logical equivalence.
 
     Task: Compare the original Snowflake SQL with the newly produced ANSI SQL to verify they match in logic, structure, and results. If corrections are needed, output ONLY the final corrected ANSI SQL. Otherwise, output the given ANSI SQL as is.
@@ -260,59 +467,303 @@ def validate_ansi_sql(state: ConverterState) -> dict:
      - The final output that will be produced should be correct syntactically and semantically. Keywords should be ANSI Compliant.
     End of prompt.
     """
-        user_message = (
-            "Original Snowflake SQL:\n"
-            f"{original_sql}\n\n"
-            "ANSI SQL:\n"
-            f"{candidate_sql}"
-        )
 
-        response = llm.invoke(
-            [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message},
-            ]
-        )
-        validated_sql = response.content.strip()
+# The translator and validator run as one call: translate, self-review, and return JSON
+TRANSLATE_VALIDATE_SYS = TRANSLATOR_SYS + VALIDATOR_SYS + """
+    Combined task:
+     - First translate the Snowflake SQL to ANSI SQL as the translator above.
+     - Then self-review that translation as the validator above, treating it as the candidate ANSI SQL, and apply every correction it requires.
+     - Output format (this overrides any earlier output instructions): a single JSON object {"ansi_sql": "<final corrected ANSI SQL>"} with no other keys, text, or code fences.
+    End of prompt.
+    """
 
-        return {
-            "final_sql": validated_sql
-        }
 
-workflow = StateGraph(ConverterState)
+def translation_user_message(original_sql: str, ast_data) -> str:
+    if ast_data is None:
+        # Speculative run: the parser has not produced an AST yet
+        return "Original Snowflake SQL:\n" + original_sql
+    return "".join(
+        ("Original Snowflake SQL:\n", original_sql, "\n\nAST:\n", dumps_ast(compact_ast(ast_data)))
+    )
+
+
+async def translate_and_validate(state: ConverterState, config: RunnableConfig) -> dict:
+    user_message = translation_user_message(state["input_query"], state["ast"])
+
+    on_token = config.get("configurable", {}).get("on_token")
+    on_partial = None
+    if on_token is not None:
+        def on_partial(partial: str) -> None:
+            partial_sql = partial_json_string(partial, "ansi_sql")
+            if partial_sql:
+                on_token(partial_sql)
+
+    content = await cached_ainvoke(
+        "translate_validate",
+        [
+            {"role": "system", "content": TRANSLATE_VALIDATE_SYS},
+            {"role": "user", "content": user_message},
+        ],
+        config,
+        on_token=on_partial,
+        response_format={"type": "json_object"},
+    )
+
+    return {
+        "final_sql": extract_ansi_sql(content)
+    }
 
+# How long a finished speculative translation waits for the parser before it is used as is
+SPECULATION_GRACE_SECONDS = 0.2
+
+# Snowflake-specific constructs for which an AST is worth trying for. The AST is a hint, never a
+# requirement: TRANSLATE_VALIDATE_SYS always gets the full SQL, is told to fall back to it when the
+# AST lacks detail, and validates its own translation in the same call.
+# RE2 matches in linear time, so arbitrary user SQL cannot trigger catastrophic backtracking.
+_SNOWFLAKE_SPECIFIC_RE = re2.compile(
+    r"(?i)\b(QUALIFY|ILIKE|ASOF|MATCH_CONDITION|LATERAL|VARIANT|ARRAY|OBJECT|FLATTEN)\b"
+)
+
+
+def worth_parsing(sql: str) -> bool:
+    return _SNOWFLAKE_SPECIFIC_RE.search(sql) is not None
+
+
+# The one rule for when a query gets an AST: it is used whenever the parser is ready no later
+# than SPECULATION_GRACE_SECONDS after a translation that did without it. Waiting longer would
+# add a full round trip for what is only a hint, so a slow parser loses to the SQL-only answer,
+# at the price of one extra gpt-4o call per query that gets here. The speculative call does not
+# stream.
+async def parse_with_speculation(state: ConverterState, config: RunnableConfig) -> dict:
+    spec_config = {"configurable": {**config.get("configurable", {}), "on_token": None}}
+    parsed, result = await race_with_speculation(
+        parse_sql_to_ast(state, config),
+        translate_and_validate({**state, "ast": None}, spec_config),
+        SPECULATION_GRACE_SECONDS,
+    )
+    return result if parsed else {"ast": None, **result}
 
-workflow.add_node("ParserAgent", parse_sql_to_ast)
-workflow.add_node("TranslationAgent", translate_ast_to_ansi)
-workflow.add_node("SyntaxValidatorAgent", validate_ansi_sql)
 
-workflow.set_entry_point("ParserAgent")
+# Plain queries skip the parser and are translated, with streaming, from the SQL alone
+def route_entry(state: ConverterState) -> str:
+    return "parse" if worth_parsing(state["input_query"]) else "translate"
 
-workflow.add_edge("ParserAgent", "TranslationAgent")
-workflow.add_edge("TranslationAgent", "SyntaxValidatorAgent")
-workflow.add_edge("SyntaxValidatorAgent", END)
 
-app = workflow.compile()
+def route_after_parse(state: ConverterState) -> str:
+    return "done" if state["final_sql"] else "translate"
 
 
+# Keyed on this script's source, so the nodes and helpers the graph calls are always the current ones
+@st.cache_resource(max_entries=1)
+def get_app(script_digest: str):
+    workflow = StateGraph(ConverterState)
 
-def convert_snowflake_to_ansi(sql_query: str):
+    workflow.add_node("ParserAgent", parse_with_speculation)
+    workflow.add_node("TranslateValidateAgent", translate_and_validate)
 
-    intermediate_results = {}
+    workflow.set_conditional_entry_point(
+        route_entry,
+        {"parse": "ParserAgent", "translate": "TranslateValidateAgent"},
+    )
+
+    workflow.add_conditional_edges(
+        "ParserAgent",
+        route_after_parse,
+        {"translate": "TranslateValidateAgent", "done": END},
+    )
+    workflow.add_edge("TranslateValidateAgent", END)
+
+    return workflow.compile()
+
+
+with open(__file__, "rb") as script_file:
+    app = get_app(hashlib.sha256(script_file.read()).hexdigest())
+
+
+
+# Cached results are only valid for the prompts that produced them
+PROMPTS_DIGEST = hashlib.sha256("\0".join((PARSER_SYS, TRANSLATE_VALIDATE_SYS)).encode()).hexdigest()
+
+
+# Hashed session id, sent as the OpenAI `user` field
+def session_cache_user() -> Optional[str]:
+    ctx = get_script_run_ctx()
+    return hashlib.sha256(ctx.session_id.encode()).hexdigest() if ctx else None
+
+
+# Returns (final_sql, ast); the AST is empty for plain queries, which skip the parser, and when
+# the parser lost the race in parse_with_speculation
+def convert_snowflake_to_ansi(
+    sql_query: str,
+    on_token: Optional[Callable[[str], None]] = None,
+    parser_model: str = PARSER_MODELS[0],
+) -> tuple[str, dict]:
+    # The parser model is part of the key, so switching models really re-parses the query
+    cache_key = (sql_tokens(sql_query), parser_model, PROMPTS_DIGEST)
+    cached = get_query_result_cache().get(cache_key)
+
+    if cached:
+        final_sql, ast = cached
+        return final_sql, ast or {}
    
     initial_state = ConverterState(
         input_query=sql_query,
         ast=None,
-        final_sql="",
-        messages=[] 
+        final_sql=""
     )
 
-    final_state = app.invoke(initial_state)
-
-    intermediate_results["AST"] = final_state.get("ast", {})
+    # Streamlit elements can only be updated from the script thread, so partial SQL
+    # streamed on the event loop thread is relayed back through a queue.
+    partials = queue.Queue()
+    future = asyncio.run_coroutine_threadsafe(
+        app.ainvoke(
+            initial_state,
+            config={
+                "configurable": {
+                    "on_token": partials.put if on_token else None,
+                    "parser_model": parser_model,
+                    "user": session_cache_user(),
+                    "llm_memo": st.session_state.setdefault("llm_memo", {}),
+                    "llm_cache": get_llm_response_cache(),
+                    "chat_models": chat_models,
+                    "streaming_chat_model": streaming_chat_model,
+                }
+            },
+        ),
+        get_event_loop(),
+    )
+    try:
+        while on_token and not (future.done() and partials.empty()):
+            try:
+                partial = partials.get(timeout=0.05)
+            except queue.Empty:
+                continue
+            while not partials.empty():
+                partial = partials.get_nowait()  # only the latest text needs rendering
+            on_token(partial)
+        final_state = future.result()
+    finally:
+        # Stops the pipeline if the script run is interrupted, e.g. by a rerun
+        future.cancel()
+
+    ast = final_state.get("ast") or {}
+
+    # A failed parse is not cached, so retrying it, e.g. with the other parser model, calls the parser again
+    if final_state["final_sql"] and "error" not in ast:
+        get_query_result_cache().put(cache_key, (final_state["final_sql"], ast))
     
-    return final_state["final_sql"], intermediate_results
+    return final_state["final_sql"], ast
+
+
+BATCH_POLL_SECONDS = 10
+BATCH_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
 
+# Submits (custom_id, body) chat requests as one Batch API job and returns its id
+def submit_chat_batch(client: OpenAI, requests: list) -> str:
+    lines = b"\n".join(
+        orjson.dumps({"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": body})
+        for custom_id, body in requests
+    )
+    batch_file = client.files.create(file=("batch.jsonl", lines), purpose="batch")
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    return batch.id
+
+
+# Responses of a completed batch, keyed by custom_id
+def chat_batch_results(client: OpenAI, batch) -> dict:
+    results = {}
+    if batch.output_file_id:
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            record = orjson.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") == 200:
+                results[record["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+    return results
+
+
+def submit_translate_batch(client: OpenAI, job: dict) -> None:
+    batch_id = submit_chat_batch(
+        client,
+        [
+            (
+                f"translate-{i}",
+                {
+                    "model": "gpt-4o",
+                    "temperature": 0,
+                    "response_format": {"type": "json_object"},
+                    "messages": [
+                        {"role": "system", "content": TRANSLATE_VALIDATE_SYS},
+                        {"role": "user", "content": translation_user_message(query, ast)},
+                    ],
+                },
+            )
+            for i, (query, ast) in enumerate(zip(job["queries"], job["asts"]))
+        ],
+    )
+    job["stage"], job["batch_id"], job["status"] = "translate", batch_id, "submitted"
+
+
+# Two Batch API jobs, one for parsing and one for translation. The job is a plain dict kept in
+# st.session_state, so it survives reruns and is advanced by poll_bulk_job.
+def start_bulk_job(sql_queries: list, parser_model: str = PARSER_MODELS[0]) -> dict:
+    client = OpenAI(api_key=api_key, http_client=get_http_client())
+    job = {"queries": sql_queries, "asts": [None] * len(sql_queries), "status": "submitted"}
+
+    parse_requests = [
+        (
+            f"parse-{i}",
+            {
+                "model": parser_model,
+                "temperature": 0,
+                "messages": [
+                    {"role": "system", "content": PARSER_SYS},
+                    {"role": "user", "content": "SQL to parse:\n" + query},
+                ],
+            },
+        )
+        for i, query in enumerate(sql_queries)
+        if worth_parsing(query)
+    ]
+    if parse_requests:
+        job["stage"] = "parse"
+        job["batch_id"] = submit_chat_batch(client, parse_requests)
+    else:
+        submit_translate_batch(client, job)
+    return job
+
+
+# Checks the job's current batch once; returns (final_sql, ast) per query when the job is done.
+# The job only moves on once the next batch is submitted, so a failed call is simply retried.
+def poll_bulk_job(job: dict) -> Optional[list]:
+    client = OpenAI(api_key=api_key, http_client=get_http_client())
+    batch = client.batches.retrieve(job["batch_id"])
+    job["status"] = batch.status
+    if batch.status not in BATCH_FINAL_STATUSES:
+        return None
+    if batch.status != "completed":
+        return [(f"Error: Batch {batch.id} ended with status '{batch.status}'", {})] * len(job["queries"])
+
+    results = chat_batch_results(client, batch)
+    if job["stage"] == "parse":
+        # Plain queries, and those whose parse request failed, are translated from the SQL alone
+        job["asts"] = [
+            load_ast(results[f"parse-{i}"]) if f"parse-{i}" in results else None
+            for i in range(len(job["queries"]))
+        ]
+        submit_translate_batch(client, job)
+        return None
+
+    translated = []
+    for i, ast in enumerate(job["asts"]):
+        content = results.get(f"translate-{i}")
+        final_sql = extract_ansi_sql(content) if content is not None else "Error: translation request failed in batch"
+        translated.append((final_sql, ast or {}))
+    return translated
 
 
 
@@ -333,13 +784,27 @@ st.markdown(
 # App title
 st.title("Snowflake SQL to AWS ANSI SQL Translator")
 
+# Only the most recent chats are kept, and fewer are re-rendered on each rerun
+CHAT_HISTORY_MAX = 50
+CHAT_HISTORY_RENDERED = 20
+
+
+def chat_history_entry(question: str, answer: str, ast: dict) -> dict:
+    # ASTs are stored pre-serialized so st.json does not re-serialize them on every rerun
+    return {
+        "question": question,
+        "answer": answer,
+        "ast": dumps_ast(ast) if ast else None,
+    }
+
+
 # Initialize session state for chat history
 if "interactive_chat_history" not in st.session_state:
-    st.session_state.interactive_chat_history = []
+    st.session_state.interactive_chat_history = collections.deque(maxlen=CHAT_HISTORY_MAX)
 
 # Display previous messages
 if st.session_state.interactive_chat_history:
-    for chat in st.session_state.interactive_chat_history:
+    for chat in list(st.session_state.interactive_chat_history)[-CHAT_HISTORY_RENDERED:]:
         with st.chat_message("user"):
             st.text(chat["question"])  # Display user's input
 
@@ -350,12 +815,79 @@ if st.session_state.interactive_chat_history:
                 st.code(chat["answer"], language="sql")  # Display the main result
 
             # Show intermediate results in an expander
-            if "intermediate" in chat and chat["intermediate"]:
+            if chat.get("ast"):
                 with st.expander("View Intermediate Steps", expanded=False):  # Default not expanded
-                    for step_name, step_result in chat["intermediate"].items():
-                        if step_name == "AST":
-                            st.subheader("AST Tree")
-                            st.json(step_result)  # Display AST as JSON
+                    st.subheader("AST Tree")
+                    st.json(chat["ast"])  # Display AST as JSON
+
+# Bulk translation of an uploaded .sql file through the OpenAI Batch API
+st.sidebar.header("Bulk Translation")
+sql_file = st.sidebar.file_uploader("Upload a .sql file with one or more queries:", type=["sql"])
+if sql_file is not None and st.sidebar.button("Translate file"):
+    bulk_queries, bulk_results = [], []
+    try:
+        bulk_queries = split_sql_statements(sql_file.getvalue().decode("utf-8"))
+        if not bulk_queries:
+            st.sidebar.warning("The file does not contain any SQL statements.")
+        elif len(bulk_queries) == 1:
+            # A single query is faster on the interactive path than through a batch job
+            with st.spinner("Translating Snowflake SQL to ANSI SQL..."):
+                bulk_results = [convert_snowflake_to_ansi(bulk_queries[0], parser_model=parser_model)]
+        elif "bulk_job" in st.session_state:
+            st.sidebar.warning("A batch translation is already running. Wait for it to finish.")
+        else:
+            st.session_state.bulk_job = start_bulk_job(bulk_queries, parser_model=parser_model)
+    except UnicodeDecodeError:
+        st.sidebar.error("The file is not UTF-8 encoded text.")
+    except Exception as e:
+        bulk_results = [(f"Error: {e}", {})] * len(bulk_queries)
+
+    for bulk_query, (ansi_result, ast) in zip(bulk_queries, bulk_results):
+        with st.chat_message("user"):
+            st.text(bulk_query)
+
+        with st.chat_message("assistant"):
+            if ansi_result.startswith("Error"):
+                st.error(ansi_result)
+            else:
+                st.code(ansi_result, language="sql")
+
+            if ast:
+                with st.expander("View Intermediate Steps"):
+                    st.subheader("AST Tree")
+                    st.json(ast)  # Display AST as JSON
+
+        chat_entry = chat_history_entry(bulk_query, ansi_result, ast)
+        st.session_state.interactive_chat_history.append(chat_entry)
+
+
+# Polls the running batch job on its own timer, so the script thread is never blocked and the
+# job carries on across reruns; finished translations land in the chat history
+@st.fragment(run_every=BATCH_POLL_SECONDS)
+def bulk_job_status() -> None:
+    job = st.session_state.get("bulk_job")
+    if job is None:
+        return
+
+    try:
+        bulk_results = poll_bulk_job(job)
+    except Exception as e:
+        st.warning(f"Could not check batch {job['batch_id']}, retrying: {e}")
+        return
+
+    if bulk_results is None:
+        st.info(f"Translating {len(job['queries'])} queries in batch: {job['stage']} batch {job['status']}...")
+        return
+
+    for bulk_query, (ansi_result, ast) in zip(job["queries"], bulk_results):
+        st.session_state.interactive_chat_history.append(chat_history_entry(bulk_query, ansi_result, ast))
+    del st.session_state.bulk_job
+    st.rerun()
+
+
+if "bulk_job" in st.session_state:
+    with st.sidebar:
+        bulk_job_status()
 
 # Chat input
 user_question = st.chat_input("Type your Snowflake SQL query...")
@@ -364,29 +896,35 @@ if user_question:
     with st.chat_message("user"):
         st.text(user_question)
 
-    try:
-        ansi_result, intermediate_results = convert_snowflake_to_ansi(user_question)
-        success = True
-    except Exception as e:
-        success = False
-        intermediate_results = {}
-        ansi_result = f"Error: {e}"
+    with st.chat_message("assistant"):
+        # The final translation streams its SQL into this placeholder as it is generated
+        sql_placeholder = st.empty()
 
-    # Save the result to chat history
-    chat_entry = {"question": user_question, "answer": ansi_result, "intermediate": intermediate_results}
-    st.session_state.interactive_chat_history.append(chat_entry)
-    #st.session_state.interactive_chat_history.append((user_question, ansi_result))
+        try:
+            with st.spinner("Translating Snowflake SQL to ANSI SQL..."):
+                ansi_result, ast = convert_snowflake_to_ansi(
+                    user_question,
+                    on_token=lambda partial_sql: sql_placeholder.code(partial_sql, language="sql"),
+                    parser_model=parser_model,
+                )
+            success = True
+        except Exception as e:
+            success = False
+            ast = {}
+            ansi_result = f"Error: {e}"
 
-    with st.chat_message("assistant"):
         if success:
-            st.code(ansi_result, language="sql")  # Display ANSI SQL as a code block
+            sql_placeholder.code(ansi_result, language="sql")  # Display ANSI SQL as a code block
         else:
-            st.error(ansi_result)  # Display error message
+            sql_placeholder.error(ansi_result)  # Display error message
 
         # Show intermediate results
-        if success and intermediate_results:
+        if success and ast:
             with st.expander("View Intermediate Steps"):
-                for step_name, step_result in intermediate_results.items():
-                    if step_name == "AST":
-                        st.subheader("AST Tree")
-                        st.json(step_result)  # Display AST as JSON
+                st.subheader("AST Tree")
+                st.json(ast)  # Display AST as JSON
+
+    # Save the result to chat history
+    chat_entry = chat_history_entry(user_question, ansi_result, ast)
+    st.session_state.interactive_chat_history.append(chat_entry)
+    #st.session_state.interactive_chat_history.append((user_question, ansi_result))
@@ -0,0 +1,145 @@
+import random
+
+import pytest
+
+from ast_json import compact_ast, dumps_ast, extract_ansi_sql, load_ast, partial_json_string
+
+
+@pytest.mark.parametrize(
+    "ast, expected",
+    [
+        ({"a": None, "b": "", "c": [], "d": {}}, {}),
+        ({"select": {"where": {"args": [], "op": None}}, "from": "t"}, {"from": "t"}),
+        ({"a": {"b": {"c": {"d": None}}}, "e": 0, "f": False}, {"e": 0, "f": False}),
+        ({"args": [None, {}, [], "", {"x": None}]}, {"args": [None, {}, [], "", {}]}),
+        ([{"a": None}, None], [{}, None]),
+        ("leaf", "leaf"),
+    ],
+)
+def test_compact_ast(ast, expected):
+    assert compact_ast(ast) == expected
+
+
+def test_compact_ast_keeps_key_order():
+    ast = {"z": 1, "a": {"y": 2, "drop": None, "b": 3}, "m": [1, 2]}
+    compacted = compact_ast(ast)
+    assert list(compacted) == ["z", "a", "m"]
+    assert list(compacted["a"]) == ["y", "b"]
+
+
+def test_compact_ast_does_not_modify_input():
+    ast = {"a": {"b": None}, "c": [None]}
+    compact_ast(ast)
+    assert ast == {"a": {"b": None}, "c": [None]}
+
+
+def test_compact_ast_handles_nesting_deeper_than_the_recursion_limit():
+    depth = 20000
+    ast = leaf = {}
+    for _ in range(depth):
+        leaf["child"] = {"empty": None}
+        leaf = leaf["child"]
+    leaf["value"] = 1
+
+    node = compact_ast(ast)
+    for _ in range(depth):
+        assert list(node) == ["child"]
+        node = node["child"]
+    assert node == {"value": 1}
+
+
+def compact_ast_recursive(node):
+    if isinstance(node, list):
+        return [compact_ast_recursive(value) for value in node]
+    if not isinstance(node, dict):
+        return node
+    compacted = {}
+    for key, value in node.items():
+        if value is None or value == "":
+            continue
+        value = compact_ast_recursive(value)
+        if isinstance(value, (dict, list)) and not value:
+            continue
+        compacted[key] = value
+    return compacted
+
+
+def random_tree(rng, depth):
+    if depth == 0 or rng.random() < 0.3:
+        return rng.choice([None, "", 0, "x", [], {}])
+    if rng.random() < 0.5:
+        return [random_tree(rng, depth - 1) for _ in range(rng.randint(0, 3))]
+    return {f"k{i}": random_tree(rng, depth - 1) for i in range(rng.randint(0, 3))}
+
+
+def test_compact_ast_matches_recursive_version_on_random_trees():
+    rng = random.Random(0)
+    for _ in range(500):
+        tree = random_tree(rng, 6)
+        assert compact_ast(tree) == compact_ast_recursive(tree)
+
+
+@pytest.mark.parametrize(
+    "partial, expected",
+    [
+        ('{"ansi', None),
+        ('{"ansi_sql": "', ""),
+        ('{"ansi_sql": "SELECT 1', "SELECT 1"),
+        ('{"ansi_sql": "SELECT 1"}', "SELECT 1"),
+        ('{"ansi_sql": "SELECT 1"} trailing', "SELECT 1"),
+        ('{"ansi_sql": "SELECT\\', "SELECT"),
+        ('{"ansi_sql": "SELECT\\n', "SELECT\n"),
+        ('{"ansi_sql": "a\\\\', "a\\"),
+        ('{"ansi_sql": "a\\\\\\', "a\\"),
+        ('{"ansi_sql": "caf\\u00', "caf"),
+        ('{"ansi_sql": "caf\\u00e9', "café"),
+        ('{"ansi_sql": "say \\"hi\\', 'say "hi'),
+    ],
+)
+def test_partial_json_string(partial, expected):
+    assert partial_json_string(partial, "ansi_sql") == expected
+
+
+@pytest.mark.parametrize(
+    "content, expected",
+    [
+        ('{"a": [1, "x"]}', {"a": [1, "x"]}),
+        ('{"v": 18446744073709551615}', {"v": 2**64 - 1}),
+        ('{"v": 123456789012345678901234}', {"v": 123456789012345678901234}),
+        ('{"v": -9223372036854775809}', {"v": -(2**63) - 1}),
+        ('{"v": -99999999999999999999}', {"v": -99999999999999999999}),
+    ],
+)
+def test_load_ast(content, expected):
+    assert load_ast(content) == expected
+
+
+def test_load_ast_reports_invalid_json():
+    ast = load_ast("not json")
+    assert set(ast) == {"error", "raw_response"}
+    assert ast["raw_response"] == "not json"
+
+
+@pytest.mark.parametrize(
+    "ast, expected",
+    [
+        ({"a": [1, None], "s": "café"}, '{"a":[1,null],"s":"café"}'),
+        ({"v": 2**70}, '{"v":1180591620717411303424}'),
+        ({"v": -(2**63) - 1, "s": "café"}, '{"v":-9223372036854775809,"s":"café"}'),
+    ],
+)
+def test_dumps_ast(ast, expected):
+    assert dumps_ast(ast) == expected
+    assert load_ast(dumps_ast(ast)) == ast
+
+
+@pytest.mark.parametrize(
+    "content, expected",
+    [
+        ('{"ansi_sql": "  SELECT 1\\n"}', "SELECT 1"),
+        ("  SELECT 1  ", "SELECT 1"),
+        ('{"sql": "SELECT 1"}', '{"sql": "SELECT 1"}'),
+    ],
+)
+def test_extract_ansi_sql(content, expected):
+    assert extract_ansi_sql(content) == expected
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from speculation import race_with_speculation
+
+GRACE_SECONDS = 0.05
+
+
+async def finish_after(seconds, value):
+    await asyncio.sleep(seconds)
+    return value
+
+
+async def fail_after(seconds):
+    await asyncio.sleep(seconds)
+    raise RuntimeError("rate limited")
+
+
+@pytest.mark.parametrize(
+    "primary_seconds, speculative_seconds, expected",
+    [
+        (0.01, 0.2, (True, "primary")),
+        (0.1, 0.08, (True, "primary")),
+        (0.5, 0.01, (False, "speculative")),
+    ],
+)
+def test_race_with_speculation_picks_winner(primary_seconds, speculative_seconds, expected):
+    result = asyncio.run(
+        race_with_speculation(
+            finish_after(primary_seconds, "primary"),
+            finish_after(speculative_seconds, "speculative"),
+            GRACE_SECONDS,
+        )
+    )
+    assert result == expected
+
+
+def test_race_with_speculation_falls_back_to_primary_when_speculation_fails():
+    result = asyncio.run(
+        race_with_speculation(finish_after(0.3, "primary"), fail_after(0.01), GRACE_SECONDS)
+    )
+    assert result == (True, "primary")
+
+
+def test_race_with_speculation_cancels_both_calls_on_outer_cancellation():
+    cancelled = []
+
+    async def tracked(name):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(name)
+            raise
+
+    async def run():
+        race = asyncio.ensure_future(
+            race_with_speculation(tracked("primary"), tracked("speculative"), GRACE_SECONDS)
+        )
+        await asyncio.sleep(0.01)
+        race.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await race
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert sorted(cancelled) == ["primary", "speculative"]
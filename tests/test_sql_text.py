@@ -0,0 +1,50 @@
+import pytest
+
+from sql_text import split_sql_statements, sql_tokens
+
+
+@pytest.mark.parametrize(
+    "first, second",
+    [
+        ("SELECT a FROM t", "select  a\n  from t;"),
+        ("select a as x from t", "SELECT a x FROM t -- same alias"),
+        ("select /* all */ * from t", "select * from t"),
+    ],
+)
+def test_sql_tokens_match_whitespace_and_alias_variants(first, second):
+    assert sql_tokens(first) == sql_tokens(second)
+
+
+@pytest.mark.parametrize(
+    "first, second",
+    [
+        ("select * from orders_2023", "select * from orders_2024"),
+        ("select * from t where a > 5", "select * from t where a < -5"),
+        ("select * from t order by a ASC", "select * from t order by a DESC"),
+        ("select * from t where a IS NULL", "select * from t where a IS NOT NULL"),
+        ("select * from t where s = 'A'", "select * from t where s = 'a'"),
+        ('select "Col" from t', 'select "COL" from t'),
+    ],
+)
+def test_sql_tokens_differ_on_real_changes(first, second):
+    assert sql_tokens(first) != sql_tokens(second)
+
+
+@pytest.mark.parametrize(
+    "script, statements",
+    [
+        ("-- don't split here;\nselect 1;", ["-- don't split here;\nselect 1"]),
+        ("select 'a;b'; select 2", ["select 'a;b'", "select 2"]),
+        ("select 'it''s;'; select 2;", ["select 'it''s;'", "select 2"]),
+        ('select "x;y" from t; select 2', ['select "x;y" from t', "select 2"]),
+        ("select /* ; */ 1; select 2", ["select /* ; */ 1", "select 2"]),
+        (
+            "create function f() returns int as $$a;b$$; select 2",
+            ["create function f() returns int as $$a;b$$", "select 2"],
+        ),
+        ("select 1;;\n  ;\n-- trailing note\n", ["select 1"]),
+        ("select 'unterminated; still one", ["select 'unterminated; still one"]),
+    ],
+)
+def test_split_sql_statements(script, statements):
+    assert split_sql_statements(script) == statements